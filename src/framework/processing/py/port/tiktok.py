@@ -1,12 +1,16 @@
+import codecs
 import json
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from datetime import datetime
 import logging
 import zipfile
 import os
 import io
 import re
+from functools import lru_cache
+from operator import itemgetter
 from bs4 import UnicodeDammit
 from pathlib import Path
 import port.api.props as props
@@ -24,7 +28,32 @@ from port.validate import (
 
 logger = logging.getLogger(__name__)
 
-DATA_FORMAT = None  # Will be set to 'json' or 'txt' in extract_tiktok_data
+
+# Matches a single "key: value" line in a TikTok txt export, split on the first ": "
+_ENTRY_RE = re.compile(r'^(.*?): (.*)$', re.MULTILINE)
+# Entries are separated by blank lines, which may hold whitespace or a \r (CRLF exports)
+_ENTRY_SEPARATOR_RE = re.compile(r'\n\s*\n')
+
+# Placeholders shared by every parsed record
+_NO_URL = 'Geen URL'
+_NO_DATE = 'Geen Datum'
+_NO_DETAILS = 'Geen Details'
+
+# Dates as written by TikTok; anything before the cutoff is treated as missing
+_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+_DATE_CUTOFF = pd.Timestamp('2000-01-01')
+
+# Number of bytes UnicodeDammit gets to guess the encoding of a non UTF-8 file
+_ENCODING_SAMPLE_SIZE = 65536
+
+# Columns every row of the combined activity table needs, filled with "Geen <column>" if absent
+_REQUIRED_COLUMNS = ('Type', 'Actie', 'URL', 'Datum', 'Details')
+
+# Low-cardinality columns of the combined activity table
+_CATEGORICAL_COLUMNS = ('Type', 'Bron')
+
+# Numbered files (e.g. 123.json) are left out of the logged key overview
+_match_numeric_file = re.compile(r'^\d+\.(?:html|json)$').match
 
 DDP_CATEGORIES = [
     DDPCategory(
@@ -78,21 +107,25 @@ def validate(file: Path) -> ValidateInput:
     
     try:
         paths = []
+        names = []
         with zipfile.ZipFile(file, "r") as zf:
+            # ZipFile has already parsed the whole central directory here, so one pass
+            # with plain string checks is all the scanning left to do
             for f in zf.namelist():
-                p = Path(f)
-                if p.suffix in (".json", ".txt"):
-                    # logger.debug("Found: %s in zip", p.name)
-                    paths.append(p.name)
+                if f.endswith((".json", ".txt")):
+                    # logger.debug("Found: %s in zip", f)
+                    paths.append(f)
+                    names.append(f.rpartition("/")[2])
 
-        validation.infer_ddp_category(paths)
+        # Categories are matched on file names; the full paths are kept for extraction
+        validation.infer_ddp_category(names)
         
         if validation.ddp_category is None:
             logger.warning("Could not infer DDP category")
             validation.set_status_code(1)  # Not a valid DDP
         elif validation.ddp_category.ddp_filetype in (DDPFiletype.JSON, DDPFiletype.TXT):
             validation.set_status_code(0)  # Valid DDP
-            logger.info(f"Valid DDP inferred")
+            logger.info("Valid DDP inferred")
             # Log the valid TikTok files found
             # for p in paths:
             #     logger.debug("Found: %s in zip", p)
@@ -104,536 +137,593 @@ def validate(file: Path) -> ValidateInput:
         logger.error("Bad zip file")
         validation.set_status_code(2)  # Bad zipfile
     except Exception as e:
-        logger.error(f"Unexpected error during validation: {str(e)}")
+        logger.error("Unexpected error during validation: %s", e)
         validation.set_status_code(1)  # Not a valid DDP
     validation.validated_paths = paths  # Store the validated paths
     return validation
 
 
-def extract_tiktok_data(tiktok_zip: str) -> Dict[str, Any]:
-    global DATA_FORMAT
+def _decode(raw_data: bytes, errors: str = 'strict') -> str:
+    """
+    Decode a TikTok export file with a cheap encoding detection
+
+    Checks for a byte order mark, then tries UTF-8 (what TikTok writes in practice)
+    and returns that result directly. Only if both fail UnicodeDammit is run,
+    on a bounded sample instead of the whole file.
+    """
+    if raw_data.startswith(codecs.BOM_UTF8):
+        return raw_data.decode('utf-8-sig', errors)
+    if raw_data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return raw_data.decode('utf-16', errors)
+    try:
+        return raw_data.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    encoding = UnicodeDammit(raw_data[:_ENCODING_SAMPLE_SIZE]).original_encoding or 'utf-8'
+    return raw_data.decode(encoding, errors)
+
+
+def extract_tiktok_data(tiktok_zip: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Read the .json or .txt members of a TikTok zip.
+    Returns the extracted data and the format it was read in ('json' or 'txt').
+    """
     data = {}
+    data_format = "json"
     try:
         with zipfile.ZipFile(tiktok_zip, 'r') as zip_ref:
-            file_list = zip_ref.namelist()
-            
-            json_files = [f for f in file_list if f.endswith('.json')]
-            txt_files = [f for f in file_list if f.endswith('.txt')]
-            
-            if json_files:
-                DATA_FORMAT = "json"
-                files_to_process = json_files
+            infos = [
+                i for i in zip_ref.infolist()
+                if not i.is_dir() and i.filename.endswith(('.json', '.txt'))
+            ]
+
+            json_infos = [i for i in infos if i.filename.endswith('.json')]
+            if json_infos:
+                data_format = "json"
+                infos_to_process = json_infos
             else:
-                DATA_FORMAT = "txt"
-                files_to_process = txt_files
+                data_format = "txt"
+                infos_to_process = [i for i in infos if i.filename.endswith('.txt')]
             
-            for file in files_to_process:
-                with zip_ref.open(file) as f:
+            for info in infos_to_process:
+                file = info.filename
+                # Opening by ZipInfo skips the name lookup in the central directory
+                # Parse after the member stream is closed so its decompressor is released first
+                with zip_ref.open(info) as f:
                     raw_data = f.read()
-                    # Use UnicodeDammit to detect the encoding
-                    suggestion = UnicodeDammit(raw_data)
-                    encoding = suggestion.original_encoding
-                    # logger.debug(f"Encountered encoding: {encoding}.")
-
-                    try:
-                        if DATA_FORMAT == "json":
-                            data[os.path.basename(file)] = json.loads(raw_data.decode(encoding))
-                        elif DATA_FORMAT == "txt":
-                            content = raw_data.decode(encoding, errors='ignore')
-                            category = os.path.basename(os.path.dirname(file))
-                            file_name = os.path.basename(file).split('.')[0]
-                            parsed_data = parse_txt_file(content, file_name)
-                            if category not in data:
-                                data[category] = {}
-                            data[category][file_name] = parsed_data
-                    except (UnicodeDecodeError, json.JSONDecodeError) as e:
-                        logger.error(f"Error processing file {file} with encoding {encoding}: {str(e)}")
-                        continue  # Skip the problematic file and continue with others
+
+                try:
+                    if data_format == "json":
+                        try:
+                            # json.loads detects UTF-8/16/32 from the bytes themselves
+                            data[os.path.basename(file)] = json.loads(raw_data)
+                        except UnicodeDecodeError:
+                            data[os.path.basename(file)] = json.loads(_decode(raw_data))
+                    elif data_format == "txt":
+                        content = _decode(raw_data, errors='ignore')
+                        category = os.path.basename(os.path.dirname(file))
+                        file_name = os.path.basename(file).split('.')[0]
+                        parsed_data = parse_txt_file(content, file_name)
+                        if category not in data:
+                            data[category] = {}
+                        data[category][file_name] = parsed_data
+                except (UnicodeDecodeError, LookupError, json.JSONDecodeError) as e:
+                    logger.error("Error processing file %s: %s", file, e)
+                    continue  # Skip the problematic file and continue with others
 
     except Exception as e:
-        logger.error(f"Error reading TikTok zip file: {str(e)}")
+        logger.error("Error reading TikTok zip file: %s", e)
         logger.exception("Exception details:")
     
-    return data
+    return data, data_format
 
 def parse_txt_file(content: str, file_name: str) -> List[Dict[str, Any]]:
-    entries = content.strip().split('\n\n')
-    parsed_data = []
-    for entry in entries:
-        item = {}
-        lines = entry.split('\n')
-        for line in lines:
-            parts = line.split(': ', 1)
-            if len(parts) == 2:
-                key, value = parts
-                item[key] = value.strip()
-            else:
-                return []
-                # item['Content'] = item.get('Content', '') + ' ' + line.strip()
-        if item:
-            parsed_data.append(item)
-    return parsed_data
-
-def safe_get(data: Dict[str, Any], *keys: str, default: Any = None) -> Any:
-    for key in keys:
-        if isinstance(data, dict) and key in data:
-            data = data[key]
+    entries = _ENTRY_SEPARATOR_RE.split(content.strip())
+    # Lines without a "key: value" pair are skipped instead of discarding the whole file
+    items = ({key: value.strip() for key, value in _ENTRY_RE.findall(entry)} for entry in entries)
+    return [item for item in items if item]
+
+def _record_columns(records: List[Dict[str, Any]], defaults: Dict[str, Any]) -> List[List[Any]]:
+    """
+    Read the keys of `defaults` from every record in a single pass, one list per key.
+    Exports normally carry every key on every record, so itemgetter reads them all at once;
+    if a key is missing somewhere the records are read again with the defaults filled in.
+    """
+    keys = tuple(defaults)
+    try:
+        rows = list(map(itemgetter(*keys), records))
+    except KeyError:
+        values = tuple(defaults.values())
+        rows = [tuple(map(record.get, keys, values)) for record in records]
+        if len(keys) == 1:
+            rows = [row[0] for row in rows]
+    if len(keys) == 1:
+        return [rows]
+    if not rows:
+        return [[] for _ in keys]
+    return [list(column) for column in zip(*rows)]
+
+def _json_details(key: str, values: List[Any]) -> List[str]:
+    """
+    Details strings equal to json.dumps({key: value}) for each value.
+    These columns repeat a handful of values, so each distinct string is encoded once.
+    """
+    template = '{' + json.dumps(key) + ': %s}'
+    encoded = {}
+    details = []
+    for value in values:
+        if isinstance(value, str):
+            text = encoded.get(value)
+            if text is None:
+                text = encoded[value] = template % json.dumps(value)
         else:
-            return default
-    return data
-
-def parse_following_list(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        following_key = "Following"
-        title_key = "UserName"
-    elif DATA_FORMAT == "txt":
-        following_key = "Following"
-        title_key = "Username"
-    
-    following_list = helpers.find_items_bfs(data, following_key)
-    if not following_list:
-      return []
-    return [
-        {
-            'Type': 'Gevolgde Accounts',
-            'Actie': "'Gevolgd': " + user.get(title_key, 'Unknown'),
-            'URL': 'Geen URL',
-            'Datum': user.get('Date', 'Geen Datum'),
-            'Details': "Geen Details",
-            'Bron': "TikTok: Followed Accounts"
-        } for user in following_list if isinstance(user, dict)
-    ]
+            text = template % json.dumps(value)
+        details.append(text)
+    return details
 
-def parse_hashtags(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        hashtag_key = "HashtagList"
-        name_key = "HashtagName"
-        link_key = "HashtagLink"
-    elif DATA_FORMAT == "txt":
-        hashtag_key = "Hashtag"
-        name_key = "Hashtag Name"
-        link_key = "Hashtag Link"
-    
-    hashtags = helpers.find_items_bfs(data, hashtag_key)
-    if not hashtags:
-      return []
-    return [
-        {
-            'Type': 'Hashtags',
-            'Actie': "'Hashtag gebruik': " + ht.get(name_key, 'Unknown'),
-            'URL': ht.get(link_key, ''),
-            'Datum': 'Geen Datum',
-            'Details': "Geen Details",
-            'Bron': "TikTok: Hashtag Use"
-        } for ht in hashtags if isinstance(ht, dict)
-    ]
+def parse_following_list(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    following_key, title_key = keys
 
-def parse_login_history(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        login_key = "LoginHistoryList"
-        device_model_key = "DeviceModel"
-        device_system_key = "DeviceSystem"
-        network_type_key = "NetworkType"
-    elif DATA_FORMAT == "txt":
-        login_key = "Login History"
-        device_model_key = "Device Model"
-        device_system_key = "Device System"
-        network_type_key = "Network Type"
-    
-    logins = helpers.find_items_bfs(data, login_key)
+    following_list = items_by_key.get(following_key)
+    if not following_list:
+      return pd.DataFrame()
+    users = [user for user in following_list if isinstance(user, dict)]
+    n = len(users)
+    names, dates = _record_columns(users, {title_key: 'Unknown', 'Date': _NO_DATE})
+    return pd.DataFrame({
+        'Type': ['Gevolgde Accounts'] * n,
+        'Actie': ["'Gevolgd': " + name for name in names],
+        'URL': [_NO_URL] * n,
+        'Datum': dates,
+        'Details': [_NO_DETAILS] * n,
+        'Bron': ["TikTok: Followed Accounts"] * n
+    })
+
+def parse_hashtags(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    hashtag_key, name_key, link_key = keys
+
+    hashtags = items_by_key.get(hashtag_key)
+    if not hashtags:
+      return pd.DataFrame()
+    hashtags = [ht for ht in hashtags if isinstance(ht, dict)]
+    n = len(hashtags)
+    names, links = _record_columns(hashtags, {name_key: 'Unknown', link_key: ''})
+    return pd.DataFrame({
+        'Type': ['Hashtags'] * n,
+        'Actie': ["'Hashtag gebruik': " + name for name in names],
+        'URL': links,
+        'Datum': [_NO_DATE] * n,
+        'Details': [_NO_DETAILS] * n,
+        'Bron': ["TikTok: Hashtag Use"] * n
+    })
+
+def parse_login_history(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    login_key, device_model_key, device_system_key, network_type_key = keys
+
+    logins = items_by_key.get(login_key)
     # logger.info(f"Login data from {logins}")
     if not logins:
-      return []
-    return [
-        {
-            'Type': 'tiktok_login',
-            'Actie': 'Login',
-            'title': "Login from Device",
-            'URL': 'Geen URL',
-            'Datum': login.get('Date', 'Geen Datum'),
-            'Details': "Geen Details"
-        } for login in logins if isinstance(login, dict)
-    ]
-
-def parse_video_history(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        video_key = "VideoList"
-    elif DATA_FORMAT == "txt":
-        video_key = "Browsing History"
-    
-    videos = helpers.find_items_bfs(data, video_key)
+      return pd.DataFrame()
+    logins = [login for login in logins if isinstance(login, dict)]
+    n = len(logins)
+    return pd.DataFrame({
+        'Type': ['tiktok_login'] * n,
+        'Actie': ['Login'] * n,
+        'title': ["Login from Device"] * n,
+        'URL': [_NO_URL] * n,
+        'Datum': [login.get('Date', _NO_DATE) for login in logins],
+        'Details': [_NO_DETAILS] * n
+    })
+
+def parse_video_history(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    video_key, = keys
+
+    videos = items_by_key.get(video_key)
     if not videos:
-      return []
-    return [
-        {
-            'Type': 'Kijkgeschiedenis',
-            'Actie': 'Bekeken',
-            'URL': video.get('Link', ''),
-            'Datum': video.get('Date', 'Geen Datum'),
-            'Details': "Geen Details",
-            'Bron': "TikTok: Video Watch History"
-        } for video in videos if isinstance(video, dict)
-    ]
-
-def parse_share_history(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        share_key = "ShareHistoryList"
-        content_key = "SharedContent"
-    elif DATA_FORMAT == "txt":
-        share_key = "Share History"
-        content_key = "Shared Content"
-    
-    shares = helpers.find_items_bfs(data, share_key)
+      return pd.DataFrame()
+    videos = [video for video in videos if isinstance(video, dict)]
+    n = len(videos)
+    links, dates = _record_columns(videos, {'Link': '', 'Date': _NO_DATE})
+    return pd.DataFrame({
+        'Type': ['Kijkgeschiedenis'] * n,
+        'Actie': ['Bekeken'] * n,
+        'URL': links,
+        'Datum': dates,
+        'Details': [_NO_DETAILS] * n,
+        'Bron': ["TikTok: Video Watch History"] * n
+    })
+
+def parse_share_history(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    share_key, content_key = keys
+
+    shares = items_by_key.get(share_key)
     if not shares:
-      return []
-    return [
-        {
-            'Type': 'Shares',
-            'Actie': "'Shared': " + share.get(content_key, 'Unknown'),
-            'URL': share.get('Link', ''),
-            'Datum': share.get('Date', 'Geen Datum'),
-            'Details': json.dumps({'Method': share.get('Method', '')}),
-            'Bron': "TikTok: Video Watch History"
-        } for share in shares if isinstance(share, dict)
-    ]
-
-def parse_like_history(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        like_key = "ItemFavoriteList"
-    elif DATA_FORMAT == "txt":
-        like_key = "Like List"
-    
-    likes = helpers.find_items_bfs(data, like_key)
+      return pd.DataFrame()
+    shares = [share for share in shares if isinstance(share, dict)]
+    n = len(shares)
+    contents, links, dates, methods = _record_columns(
+        shares, {content_key: 'Unknown', 'Link': '', 'Date': _NO_DATE, 'Method': ''}
+    )
+    return pd.DataFrame({
+        'Type': ['Shares'] * n,
+        'Actie': ["'Shared': " + content for content in contents],
+        'URL': links,
+        'Datum': dates,
+        'Details': _json_details('Method', methods),
+        'Bron': ["TikTok: Video Watch History"] * n
+    })
+
+def parse_like_history(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    like_key, = keys
+
+    likes = items_by_key.get(like_key)
     if not likes:
-      return []
-    return [
-        {
-            'Type': 'Likes',
-            'Actie': 'Video Geliket',
-            'URL': like.get('Link', ''),
-            'Datum': like.get('Date', 'Geen Datum'),
-            'Details': "Geen Details",
-            'Bron': "TikTok: Likes"
-        } for like in likes if isinstance(like, dict)
-    ]
-    
-def parse_fav_history(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        like_key = "FavoriteVideoList"
-    elif DATA_FORMAT == "txt":
-        like_key = "Favorite Videos"
+      return pd.DataFrame()
+    likes = [like for like in likes if isinstance(like, dict)]
+    n = len(likes)
+    links, dates = _record_columns(likes, {'Link': '', 'Date': _NO_DATE})
+    return pd.DataFrame({
+        'Type': ['Likes'] * n,
+        'Actie': ['Video Geliket'] * n,
+        'URL': links,
+        'Datum': dates,
+        'Details': [_NO_DETAILS] * n,
+        'Bron': ["TikTok: Likes"] * n
+    })
     
-    likes = helpers.find_items_bfs(data, like_key)
+def parse_fav_history(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    like_key, = keys
+
+    likes = items_by_key.get(like_key)
     if not likes:
-      return []
-    return [
-        {
-            'Type': 'Favoriete Videos',
-            'Actie': 'Gefavoriet',
-            'URL': like.get('Link', ''),
-            'Datum': like.get('Date', 'Geen Datum'),
-            'Details': "Geen Details",
-            'Bron': "TikTok: Favorited Videos"
-        } for like in likes if isinstance(like, dict)
-    ]
+      return pd.DataFrame()
+    likes = [like for like in likes if isinstance(like, dict)]
+    n = len(likes)
+    links, dates = _record_columns(likes, {'Link': '', 'Date': _NO_DATE})
+    return pd.DataFrame({
+        'Type': ['Favoriete Videos'] * n,
+        'Actie': ['Gefavoriet'] * n,
+        'URL': links,
+        'Datum': dates,
+        'Details': [_NO_DETAILS] * n,
+        'Bron': ["TikTok: Favorited Videos"] * n
+    })
     
-def parse_fav_hashtag(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        like_key = "FavoriteHashtagList"
-    elif DATA_FORMAT == "txt":
-        like_key = "Favorite HashTags"
-    
-    likes = helpers.find_items_bfs(data, like_key)
-    if not likes:
-      return []
-    return [
-        {
-            'Type': 'Favoriete Hashtags',
-            'Actie': 'Gefavoriet',
-            'URL': like.get('Link', like.get('HashTag Link', like.get('HashTag Link:', ''))),
-            'Datum': like.get('Date', 'Geen Datum'),
-            'Details': "Geen Details",
-            'Bron':  "Hashtags Favorited"
-        } for like in likes if isinstance(like, dict)
-    ]
+def parse_fav_hashtag(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    like_key, = keys
 
-def parse_search_history(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        search_key = "SearchList"
-        term_key = "SearchTerm"
-    elif DATA_FORMAT == "txt":
-        search_key = "Searches"
-        term_key = "Search Term"
-    
-    searches = helpers.find_items_bfs(data, search_key)
+    likes = items_by_key.get(like_key)
+    if not likes:
+      return pd.DataFrame()
+    likes = [like for like in likes if isinstance(like, dict)]
+    n = len(likes)
+    return pd.DataFrame({
+        'Type': ['Favoriete Hashtags'] * n,
+        'Actie': ['Gefavoriet'] * n,
+        'URL': [like.get('Link') or like.get('HashTag Link') or like.get('HashTag Link:') or '' for like in likes],
+        'Datum': [like.get('Date', _NO_DATE) for like in likes],
+        'Details': [_NO_DETAILS] * n,
+        'Bron': ["Hashtags Favorited"] * n
+    })
+
+def parse_search_history(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    search_key, term_key = keys
+
+    searches = items_by_key.get(search_key)
     if not searches:
-      return []
-    return [
-        {
-            'Type': 'Zoekopdrachten',
-            'Actie': "'Gezocht naar:' " + search.get(term_key, 'Unknown search'),
-            'URL': 'Geen URL',
-            'Datum': search.get('Date', 'Geen Datum'),
-            'Details': "Geen Details",
-            'Bron': "TikTok: Searches"
-        } for search in searches if isinstance(search, dict)
-    ]
-
-def parse_ad_info(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        ad_key = "AdInterestCategories"
-    elif DATA_FORMAT == "txt":
-        ad_key = "Ad Interests"
-
-    ad_interests = helpers.find_items_bfs(data, ad_key)
+      return pd.DataFrame()
+    searches = [search for search in searches if isinstance(search, dict)]
+    n = len(searches)
+    terms, dates = _record_columns(searches, {term_key: 'Unknown search', 'Date': _NO_DATE})
+    return pd.DataFrame({
+        'Type': ['Zoekopdrachten'] * n,
+        'Actie': ["'Gezocht naar:' " + term for term in terms],
+        'URL': [_NO_URL] * n,
+        'Datum': dates,
+        'Details': [_NO_DETAILS] * n,
+        'Bron': ["TikTok: Searches"] * n
+    })
+
+def parse_ad_info(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    ad_key, = keys
+
+    ad_interests = items_by_key.get(ad_key)
     if not ad_interests or not isinstance(ad_interests, str):
-        return []
+        return pd.DataFrame()
 
     # Split the single string into individual interests
-    return [
-        {
-            'Type': 'Advertentie Info',
-            'Actie': "'Info voor targeting': " + interest.strip(),  # Strip any extra whitespace
-            'URL': 'Geen URL',
-            'Datum': 'Geen Datum',
-            'Details': "Geen Details",
-            'Bron': "TikTok: Ad Interests"
-        }
-        for interest in ad_interests.split(',')  # Split by comma and iterate over individual interests
-    ]
+    interests = ad_interests.split(',')
+    n = len(interests)
+    return pd.DataFrame({
+        'Type': ['Advertentie Info'] * n,
+        'Actie': ["'Info voor targeting': " + interest.strip() for interest in interests],  # Strip any extra whitespace
+        'URL': [_NO_URL] * n,
+        'Datum': [_NO_DATE] * n,
+        'Details': [_NO_DETAILS] * n,
+        'Bron': ["TikTok: Ad Interests"] * n
+    })
 
     
-def parse_ad_ca(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        ad_key = "OffTikTokActivityDataList"
-    elif DATA_FORMAT == "txt":
-        ad_key = "Off TikTok Activity"
-    
-    ad_interests = helpers.find_items_bfs(data, ad_key)
+def parse_ad_ca(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    ad_key, = keys
+
+    ad_interests = items_by_key.get(ad_key)
     if not ad_interests:
-      return []
-    return [
-        {
-            'Type': 'Advertentie Info',
-            'Actie': "'Gebruikte jouw gegevens': " + interest.get("Source", 'Unknown uploader'),
-            'URL': 'Geen URL',
-            'Datum': interest.get("TimeStamp", interest.get("Date", '')),
-            'Details': interest.get("Event", 'Unknown action'),
-            'Bron': "TikTok: Custom Audiences"
-        } for interest in ad_interests if isinstance(interest, dict) and interest.get("Event") == "Customer file upload"
+      return pd.DataFrame()
+    uploads = [
+        interest for interest in ad_interests
+        if isinstance(interest, dict) and interest.get("Event") == "Customer file upload"
     ]
+    n = len(uploads)
+    return pd.DataFrame({
+        'Type': ['Advertentie Info'] * n,
+        'Actie': ["'Gebruikte jouw gegevens': " + upload.get("Source", 'Unknown uploader') for upload in uploads],
+        'URL': [_NO_URL] * n,
+        'Datum': [upload.get("TimeStamp") or upload.get("Date", '') for upload in uploads],
+        'Details': [upload.get("Event", 'Unknown action') for upload in uploads],
+        'Bron': ["TikTok: Custom Audiences"] * n
+    })
 
 
-def parse_comments(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if DATA_FORMAT == "json":
-        comments_key = "CommentsList"
-    elif DATA_FORMAT == "txt":
-        comments_key = "Comments"
-    
-    comments = helpers.find_items_bfs(data, comments_key)
+def parse_comments(items_by_key: Dict[str, Any], keys: Tuple[str, ...]) -> pd.DataFrame:
+    comments_key, = keys
+
+    comments = items_by_key.get(comments_key)
     if not comments:
-      return []
-    return [
-        {
-            'Type': 'Reacties',
-            'Actie': "'Gereageerd': " + comment.get('Comment', ''),
-            'URL': comment.get('Url', ''),
-            'Datum': comment.get('Date', 'Geen Datum'),
-            'Details': json.dumps({'Photo': comment.get('Photo', '')}),
-            'Bron': "TikTok: Ad Interests"
-        } for comment in comments if isinstance(comment, dict)
-    ]
+      return pd.DataFrame()
+    comments = [comment for comment in comments if isinstance(comment, dict)]
+    n = len(comments)
+    texts, urls, dates, photos = _record_columns(
+        comments, {'Comment': '', 'Url': '', 'Date': _NO_DATE, 'Photo': ''}
+    )
+    return pd.DataFrame({
+        'Type': ['Reacties'] * n,
+        'Actie': ["'Gereageerd': " + text for text in texts],
+        'URL': urls,
+        'Datum': dates,
+        'Details': _json_details('Photo', photos),
+        'Bron': ["TikTok: Ad Interests"] * n
+    })
+
+# Record keys per export format, looked up once per run instead of in every parser
+_KEYS = {
+    'json': {
+        'following': ("Following", "UserName"),
+        'hashtags': ("HashtagList", "HashtagName", "HashtagLink"),
+        'login_history': ("LoginHistoryList", "DeviceModel", "DeviceSystem", "NetworkType"),
+        'video_history': ("VideoList",),
+        'share_history': ("ShareHistoryList", "SharedContent"),
+        'like_history': ("ItemFavoriteList",),
+        'fav_history': ("FavoriteVideoList",),
+        'fav_hashtag': ("FavoriteHashtagList",),
+        'search_history': ("SearchList", "SearchTerm"),
+        'ad_info': ("AdInterestCategories",),
+        'ad_ca': ("OffTikTokActivityDataList",),
+        'comments': ("CommentsList",),
+    },
+    'txt': {
+        'following': ("Following", "Username"),
+        'hashtags': ("Hashtag", "Hashtag Name", "Hashtag Link"),
+        'login_history': ("Login History", "Device Model", "Device System", "Network Type"),
+        'video_history': ("Browsing History",),
+        'share_history': ("Share History", "Shared Content"),
+        'like_history': ("Like List",),
+        'fav_history': ("Favorite Videos",),
+        'fav_hashtag': ("Favorite HashTags",),
+        'search_history': ("Searches", "Search Term"),
+        'ad_info': ("Ad Interests",),
+        'ad_ca': ("Off TikTok Activity",),
+        'comments': ("Comments",),
+    },
+}
+
+# Parsers run by process_tiktok_data, in the order their records are collected,
+# each paired with its entry in _KEYS
+PARSING_FUNCTIONS = [
+    # ('login_history', parse_login_history),
+    ('video_history', parse_video_history),
+    ('share_history', parse_share_history),
+    ('like_history', parse_like_history),
+    ('fav_hashtag', parse_fav_hashtag),
+    ('fav_history', parse_fav_history),
+    ('ad_ca', parse_ad_ca),
+    ('search_history', parse_search_history),
+    ('ad_info', parse_ad_info),
+    ('comments', parse_comments),
+    ('following', parse_following_list),
+    ('hashtags', parse_hashtags)
+]
+
+# Keys the parsers look up in the extracted data, per export format
+_WANTED_KEYS = {
+    data_format: frozenset(keys[name][0] for name, _ in PARSING_FUNCTIONS)
+    for data_format, keys in _KEYS.items()
+}
+
+def parse_data(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    df = pd.concat(frames, ignore_index=True, copy=False)
+
+    # The parsers emit all of these; a missing one is added in a single assign instead of per column
+    missing_columns = [col for col in _REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        df = df.assign(**{col: "Geen " + col for col in missing_columns})
+
+    # Type and Bron only hold a handful of labels; categoricals store them as small int codes
+    categorical_columns = {col: 'category' for col in _CATEGORICAL_COLUMNS if col in df.columns}
+    df = df.astype(categorical_columns, copy=False)
 
-def parse_data(data: List[Dict[str, Any]]) -> pd.DataFrame:
-    df = pd.DataFrame(data)
-    
-    required_columns = ['Type', 'Actie', 'URL', 'Datum', 'Details']
-    for col in required_columns:
-        if col not in df.columns:
-            df[col] = "Geen " + col
-    
     return df
 
+def normalize_dates(dates: pd.Series) -> pd.Series:
+    """
+    Parse the Datum column to naive datetime64, with NaT for missing,
+    unparseable and pre-2000 dates.
+
+    The TikTok format is parsed with an explicit format first, only the values
+    left over go through format inference. Values carrying a UTC offset are
+    converted to UTC, so the result is always a single datetime64 column.
+    """
+    missing = dates.isna() | dates.isin(['', _NO_DATE])
+    parsed = pd.to_datetime(dates, format=_DATE_FORMAT, errors='coerce', utc=True)
+    residue = parsed.isna() & ~missing
+    if residue.any():
+        parsed[residue] = pd.to_datetime(dates[residue], errors='coerce', utc=True)
+    parsed = parsed.dt.tz_localize(None)
+
+    pre_2000 = parsed < _DATE_CUTOFF
+    pre_2000_count = pre_2000.sum()
+    if pre_2000_count > 0:
+        logger.info("Converted %s entries with dates before 2000 to NaN.", pre_2000_count)
+
+    return parsed.mask(pre_2000)
+
+def format_dates(dates: pd.Series) -> pd.Series:
+    """
+    Format a datetime64 column as '%Y-%m-%d %H:%M:%S' strings, NaT becomes 'Geen Datum'.
+    numpy formats the whole array in C; strftime would call into Python per value.
+    """
+    values = dates.to_numpy(dtype='datetime64[s]')
+    iso = np.char.replace(np.datetime_as_string(values, unit='s'), 'T', ' ')
+    return pd.Series(np.where(np.isnat(values), _NO_DATE, iso), index=dates.index, dtype=object)
+
 def process_tiktok_data(tiktok_file: str) -> List[props.PropsUIPromptConsentFormTable]:
     logger = logging.getLogger("process_tiktok_data")
     logger.info("Starting to extract TikTok data.")   
 
     
-    extracted_data = extract_tiktok_data(tiktok_file)
-    # Assuming `extracted_data` is a dictionary where keys are the file paths or names.
-    filtered_extracted_data = {
-        k: v for k, v in extracted_data.items() if not re.match(r'^\d+\.(html|json)$', k.split('/')[-1])
-    }
-    
-    # Logging only the filtered keys
-    logger.info(f"Extracted data keys: {helpers.get_json_keys(filtered_extracted_data) if filtered_extracted_data else 'None'}")   
-    
-    all_data = []
-    parsing_functions = [
-        # parse_login_history, 
-        parse_video_history, 
-        parse_share_history, 
-        parse_like_history, 
-        parse_fav_hashtag,
-        parse_fav_history,
-        parse_ad_ca,
-        parse_search_history,   
-        parse_ad_info,
-        parse_comments, 
-        parse_following_list,
-        parse_hashtags
-    ]
+    extracted_data, data_format = extract_tiktok_data(tiktok_file)
+    # The key overview walks all extracted data, so only build it when it will be logged
+    if logger.isEnabledFor(logging.INFO):
+        # Assuming `extracted_data` is a dictionary where keys are the file paths or names.
+        filtered_extracted_data = {
+            k: v for k, v in extracted_data.items() if not _match_numeric_file(k.rpartition('/')[2])
+        }
+
+        # Logging only the filtered keys
+        logger.info(
+            "Extracted data keys: %s",
+            helpers.get_json_keys(filtered_extracted_data) if filtered_extracted_data else 'None'
+        )
     
-    for parse_function in parsing_functions:
+    # One walk over the extracted data serves the key lookups of every parser
+    items_by_key = helpers.index_items_bfs(extracted_data, _WANTED_KEYS[data_format])
+    keys = _KEYS[data_format]
+
+    frames = []
+    for name, parse_function in PARSING_FUNCTIONS:
         try:
-            parsed_data = parse_function(extracted_data)
-            logger.info(f"{parse_function.__name__} returned {len(parsed_data)} items")
-            all_data.extend(parsed_data)
+            parsed_df = parse_function(items_by_key, keys[name])
+            logger.info("%s returned %s items", parse_function.__name__, len(parsed_df))
+            if not parsed_df.empty:
+                frames.append(parsed_df)
         except Exception as e:
-            logger.error(f"Error in {parse_function.__name__}: {str(e)}")
+            logger.error("Error in %s: %s", parse_function.__name__, e)
     
     tables_to_render = []
     
-    if all_data:
-        combined_df = parse_data(all_data)
-        logger.info(f"Combined data frame shape: {combined_df.shape}")
-        
-        if not combined_df.empty:
-            combined_df['Datum'] = pd.to_datetime(combined_df['Datum'], errors='coerce')
-            
-            # Count entries with dates before 2000
-            pre_2000_count = (combined_df['Datum'] < pd.Timestamp('2000-01-01')).sum()
-            if pre_2000_count > 0:
-                logger.info(f"Found {pre_2000_count} entries with dates before 2000.")
-        
-                try:
-                    # Convert dates before 2000 to NaT (pandas' equivalent of NaN for datetime)
-                    combined_df.loc[combined_df['Datum'] < pd.Timestamp('2000-01-01'), 'Datum'] = pd.NaT
-                    
-                    # Confirm conversion
-                    post_conversion_count = (combined_df['Datum'] < pd.Timestamp('2000-01-01')).sum()
-                    if post_conversion_count == 0:
-                        logger.info(f"Successfully converted {pre_2000_count} entries with dates before 2000 to NaN.")
-                    else:
-                        logger.info(f"Failed to convert some entries with dates before 2000 to NaN. Remaining: {post_conversion_count}.")
-        
-                except Exception as e:
-                    logger.info(f"Error converting dates before 2000 to NaN: {e}")
-                
-            combined_df = combined_df.sort_values(by='Datum', ascending=False, na_position='last').reset_index(drop=True)
-            
-            # if combined_df['Actie'] == "HashtagUse:
-                # combined_df['Count'] = 0  # Add a Count column to the original data
-            # combined_df.loc[combined_df['Actie'] == 'HashtagUse', 'Count'] = 0
-            # List of columns to apply the replace_email function
-            columns_to_process = ['Details', 'Actie']
-            
-            # Loop over each column in the list
-            for column in columns_to_process:
-                try:
-                    # Ensure the column values are strings and apply the replace_email function
-                    combined_df[column] = combined_df[column].apply(lambda x: helpers.replace_email(str(x)))
-                except Exception as e:
-                    logger.warning(f"Could not replace e-mail in column '{column}': {e}")
-
-
-            combined_df['Datum'] = combined_df['Datum'].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('Geen Datum')
-
-            # Create a single table with all data
-            table_title = props.Translatable({"en": "TikTok Activity Data", "nl": "TikTok Gegevens"})
-            visses = [vis.create_chart(
-              "line", 
-              "TikTok Activiteit", 
-              "TikTok-activiteit", 
-              "Datum", 
-              y_label="Aantal keren gekeken", 
-              date_format="auto"#, 
-              # group_by="Action", 
-              # df=combined_df.groupby('Actie')['Count'].sum().reset_index()
-            )]
-
-            logger.info(f"Visualizations created: {len(visses)}")
-
-            # Pass the ungrouped data for the table and grouped data for the chart
-            table = props.PropsUIPromptConsentFormTable("tiktok_all_data", table_title, combined_df, visualizations=visses)
-            tables_to_render.append(table)
-            
-            logger.info(f"Successfully processed First {len(combined_df)} total entries from TikTok data")
-
-        else:
-            logger.warning("Combined DataFrame is empty")  
-    else:
+    if not frames:
         logger.warning("Combined DataFrame: No data was successfully extracted and parsed")
- 
+        return tables_to_render
+
+    combined_df = parse_data(frames)
+    logger.info("Combined data frame shape: %s", combined_df.shape)
+
+    combined_df['Datum'] = normalize_dates(combined_df['Datum'])
+
+    combined_df = combined_df.sort_values(by='Datum', ascending=False, na_position='last').reset_index(drop=True)
+    
+    # if combined_df['Actie'] == "HashtagUse:
+        # combined_df['Count'] = 0  # Add a Count column to the original data
+    # combined_df.loc[combined_df['Actie'] == 'HashtagUse', 'Count'] = 0
+    # List of columns to apply the replace_email function
+    columns_to_process = ['Details', 'Actie']
+    
+    # Loop over each column in the list
+    for column in columns_to_process:
+        try:
+            # Ensure the column values are strings and replace e-mail addresses in one vectorized pass
+            combined_df[column] = combined_df[column].astype(str).str.replace(
+                helpers.REGEX_EMAIL, 'this_is_an_email', regex=True
+            )
+        except Exception as e:
+            logger.warning("Could not replace e-mail in column '%s': %s", column, e)
+
+
+    combined_df['Datum'] = format_dates(combined_df['Datum'])
+
+    # Create a single table with all data
+    table_title = props.Translatable({"en": "TikTok Activity Data", "nl": "TikTok Gegevens"})
+    visses = [vis.create_chart(
+      "line", 
+      "TikTok Activiteit", 
+      "TikTok-activiteit", 
+      "Datum", 
+      y_label="Aantal keren gekeken", 
+      date_format="auto"#, 
+      # group_by="Action", 
+      # df=combined_df.groupby('Actie')['Count'].sum().reset_index()
+    )]
+
+    logger.info("Visualizations created: %s", len(visses))
+
+    # Pass the ungrouped data for the table and grouped data for the chart
+    table = props.PropsUIPromptConsentFormTable("tiktok_all_data", table_title, combined_df, visualizations=visses)
+    tables_to_render.append(table)
+    
+    logger.info("Successfully processed First %s total entries from TikTok data", len(combined_df))
+
     return tables_to_render
 
-# Helper functions for specific data types
-def video_browsing_history_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
+@lru_cache(maxsize=1)
+def _process_tiktok_data_cached(tiktok_file: str, mtime: float) -> List[props.PropsUIPromptConsentFormTable]:
+    """
+    Process a TikTok zip once and share the result between the helpers below.
+    The modification time is part of the cache key, so a replaced file is processed again.
+    Only the latest upload is kept; processing another zip releases the previous table.
+    """
+    return process_tiktok_data(tiktok_file)
+
+
+def _activity_of_type(tiktok_zip: str, activity_type: str) -> pd.DataFrame:
+    """
+    Rows of the processed TikTok table with the given Type, without the Type column.
+    Type is categorical, so the comparison runs on its integer codes.
+    """
+    tables = _process_tiktok_data_cached(tiktok_zip, os.path.getmtime(tiktok_zip))
     if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_video_view'].drop(columns=['Type'])
+        df = tables[0].data_frame
+        return df[df['Type'] == activity_type].drop(columns=['Type'])
     return pd.DataFrame()
 
+
+# Helper functions for specific data types
+
+def video_browsing_history_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
+    return _activity_of_type(tiktok_zip, 'Kijkgeschiedenis')
+
 def favorite_videos_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
-    if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_like'].drop(columns=['Type'])
-    return pd.DataFrame()
+    return _activity_of_type(tiktok_zip, 'Favoriete Videos')
 
 def following_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
-    if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_following'].drop(columns=['Type'])
-    return pd.DataFrame()
+    return _activity_of_type(tiktok_zip, 'Gevolgde Accounts')
 
 def like_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
-    if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_like'].drop(columns=['Type'])
-    return pd.DataFrame()
+    return _activity_of_type(tiktok_zip, 'Likes')
 
 def search_history_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
-    if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_search'].drop(columns=['Type'])
-    return pd.DataFrame()
+    return _activity_of_type(tiktok_zip, 'Zoekopdrachten')
 
 def share_history_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
-    if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_share'].drop(columns=['Type'])
-    return pd.DataFrame()
+    return _activity_of_type(tiktok_zip, 'Shares')
 
 def comment_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
-    if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_comment'].drop(columns=['Type'])
-    return pd.DataFrame()
+    return _activity_of_type(tiktok_zip, 'Reacties')
 
 def hashtags_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
-    if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_hashtag'].drop(columns=['Type'])
-    return pd.DataFrame()
+    return _activity_of_type(tiktok_zip, 'Hashtags')
 
 def login_history_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
-    if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_login'].drop(columns=['Type'])
-    return pd.DataFrame()
+    return _activity_of_type(tiktok_zip, 'tiktok_login')
 
 def ad_interests_to_df(tiktok_zip: str, validation: ValidateInput) -> pd.DataFrame:
-    tables = process_tiktok_data(tiktok_zip)
-    if tables:
-        df = tables[0].df
-        return df[df['Type'] == 'tiktok_ad_interest'].drop(columns=['Type'])
-    return pd.DataFrame()
+    return _activity_of_type(tiktok_zip, 'Advertentie Info')
@@ -40,6 +40,11 @@ class DDPCategory:
     language: Language | None = None
     known_files: list[str] | None = None
 
+    known_files_set: frozenset[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.known_files_set = frozenset(self.known_files or ())
+
 
 @dataclass
 class StatusCode:
@@ -73,11 +78,10 @@ class ValidateInput:
         Note: at least 5% percent of known files should match
         """
         prop_category = {}
+        input_set = set(file_list_input)
         for identifier, category in self.ddp_categories_lookup.items():
-            n_files_found = [
-                1 if f in category.known_files else 0 for f in file_list_input
-            ]
-            prop_category[identifier] = sum(n_files_found) / len(category.known_files) * 100
+            n_files_found = len(input_set & category.known_files_set)
+            prop_category[identifier] = n_files_found / len(category.known_files) * 100
 
         if max(prop_category.values()) >= 5:
             highest = max(prop_category, key=prop_category.get)  # type: ignore
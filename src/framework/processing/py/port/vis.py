@@ -1,12 +1,6 @@
-import json
-import pandas as pd
-from typing import Dict, Any, List, Optional, Literal
-from datetime import datetime
+from typing import Optional, Literal
 import logging
-import zipfile
-import io
 import port.api.props as props
-from pathlib import Path  # Import the Path object from the pathlib module
 
 logger = logging.getLogger(__name__)
 